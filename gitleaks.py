@@ -7,8 +7,42 @@ import tempfile
 import shutil
 import stat
 import json
+import hashlib
+import queue
+import re
+import threading
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from itertools import chain, islice
+
+try:
+    import json_stream
+except ImportError:
+    json_stream = None
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    from isal import igzip
+except ImportError:
+    igzip = None
 
 DEBUG = False
+DOWNLOAD_CHUNK_SIZE = 1024 * 1024
+MAX_WORKERS = min(32, os.cpu_count() or 4)
+FINDINGS_BATCH_SIZE = 1000
+SHARD_COMMIT_THRESHOLD = 5000
+BINARY_NAME = "gitleaks.exe" if sys.platform.startswith("win") else "gitleaks"
+ARCH_PATTERN = re.compile(r"amd64|x86_64|x64", re.IGNORECASE)
+CACHE_DIR = os.path.join(
+    os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache"),
+    "secutil",
+    "gitleaks"
+)
+CACHE_RELEASE_FILE = os.path.join(CACHE_DIR, "release.json")
 
 def log_info(message):
     print(f"[+] {message}")
@@ -20,16 +54,53 @@ def dprint(message):
     if DEBUG:
         print(f"[DEBUG] {message}")
 
-def get_latest_gitleaks_release():
+def create_session():
+    session = requests.Session()
+    session.headers.update({"Accept-Encoding": "gzip", "User-Agent": "secutil"})
+    session.mount("https://", requests.adapters.HTTPAdapter(pool_connections=2, pool_maxsize=4))
+    return session
+
+def get_latest_gitleaks_release(session, etag=None, fallback_bin=None):
     url = "https://api.github.com/repos/gitleaks/gitleaks/releases/latest"
-    dprint(f"Requesting latest release from: {url}")
-    response = requests.get(url)
-    if response.status_code != 200:
-        log_error(f"Failed to retrieve latest gitleaks release. Status code: {response.status_code}")
+    dprint(f"Requesting latest release from: {url} (ETag: {etag})")
+    headers = {"If-None-Match": etag} if etag else {}
+    try:
+        response = session.get(url, headers=headers)
+    except requests.RequestException as e:
+        response = None
+        failure = f"Error: {e}"
+    if response is not None and response.status_code == 304:
+        dprint("Latest release unchanged since the cached ETag.")
+        return None, etag
+    if response is None or response.status_code != 200:
+        if response is not None:
+            failure = f"Status code: {response.status_code}"
+        if fallback_bin:
+            log_info(f"Warning: failed to retrieve latest gitleaks release ({failure}) - using cached binary {fallback_bin}.")
+            return None, etag
+        log_error(f"Failed to retrieve latest gitleaks release. {failure}")
         sys.exit(1)
     release_data = response.json()
     dprint(f"Release data retrieved: {release_data}")
-    return release_data
+    return release_data, response.headers.get("ETag")
+
+def load_cached_release():
+    try:
+        with open(CACHE_RELEASE_FILE, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def save_cached_release(etag, tag_name):
+    try:
+        os.makedirs(CACHE_DIR, exist_ok=True)
+        with open(CACHE_RELEASE_FILE, "w", encoding="utf-8") as f:
+            json.dump({"etag": etag, "tag_name": tag_name}, f)
+    except OSError as e:
+        log_info(f"Warning: unable to save release cache: {e}")
+
+def cached_binary_path(tag_name):
+    return os.path.join(CACHE_DIR, tag_name, BINARY_NAME)
 
 def select_asset_for_platform(release_data):
     current_platform = sys.platform
@@ -43,75 +114,509 @@ def select_asset_for_platform(release_data):
     else:
         log_error(f"Unsupported operating system: {current_platform}")
         sys.exit(1)
-    assets = release_data.get("assets", [])
-    for asset in assets:
-        asset_name = asset.get("name", "").lower()
-        if os_key in asset_name and (("amd64" in asset_name) or ("x86_64" in asset_name) or ("x64" in asset_name)):
-            dprint(f"Selected asset: {asset.get('name', '')}")
-            return asset.get("browser_download_url")
-    log_error(f"No asset found for platform {os_key}")
-    sys.exit(1)
-
-def download_file(url, dest_path):
+    os_pattern = re.compile(os_key, re.IGNORECASE)
+    asset = next(
+        (
+            asset for asset in release_data.get("assets", [])
+            if os_pattern.search(asset.get("name", "")) and ARCH_PATTERN.search(asset.get("name", ""))
+        ),
+        None
+    )
+    if asset is None:
+        log_error(f"No asset found for platform {os_key}")
+        sys.exit(1)
+    dprint(f"Selected asset: {asset.get('name', '')}")
+    return asset.get("browser_download_url")
+
+def open_download(session, url):
     dprint(f"Downloading: {url}")
     log_info(f"Downloading gitleaks.")
-    with requests.get(url, stream=True) as r:
-        r.raise_for_status()
+    response = session.get(url, stream=True)
+    response.raise_for_status()
+    response.raw.decode_content = True
+    return response
+
+class HashingReader:
+    def __init__(self, stream):
+        self.stream = stream
+        self.hasher = hashlib.sha256()
+
+    def read(self, size=-1):
+        data = self.stream.read(size)
+        self.hasher.update(data)
+        return data
+
+    def readinto(self, buffer):
+        size = self.stream.readinto(buffer)
+        self.hasher.update(memoryview(buffer)[:size])
+        return size
+
+    def drain(self):
+        while self.read(DOWNLOAD_CHUNK_SIZE):
+            pass
+
+    def hexdigest(self):
+        return self.hasher.hexdigest()
+
+def file_sha256(f):
+    if hasattr(hashlib, "file_digest"):
+        return hashlib.file_digest(f, "sha256").hexdigest()
+    hasher = hashlib.sha256()
+    for chunk in iter(lambda: f.read(DOWNLOAD_CHUNK_SIZE), b""):
+        hasher.update(chunk)
+    return hasher.hexdigest()
+
+def get_expected_digest(session, release_data, download_url):
+    asset_name = download_url.rsplit("/", 1)[-1]
+    for asset in release_data.get("assets", []):
+        name = asset.get("name", "")
+        if name.endswith("checksums.txt") or name == f"{asset_name}.sha256":
+            checksum_url = asset.get("browser_download_url")
+            break
+    else:
+        log_info(f"Warning: no checksum published for {asset_name} - skipping integrity check.")
+        return None
+    dprint(f"Downloading checksums: {checksum_url}")
+    try:
+        response = session.get(checksum_url)
+        response.raise_for_status()
+    except requests.RequestException as e:
+        log_error(f"Failed to download checksums for {asset_name}: {e}")
+        sys.exit(1)
+    for line in response.text.splitlines():
+        parts = line.split()
+        if len(parts) == 1 and name.endswith(".sha256"):
+            return parts[0].lower()
+        if len(parts) == 2 and parts[1].lstrip("*") == asset_name:
+            return parts[0].lower()
+    log_info(f"Warning: {asset_name} not listed in {name} - skipping integrity check.")
+    return None
+
+def verify_digest(actual_digest, expected_digest):
+    if expected_digest is None:
+        return
+    dprint(f"SHA-256 of downloaded asset: {actual_digest} (expected: {expected_digest})")
+    if actual_digest != expected_digest:
+        log_error(f"Checksum mismatch for downloaded gitleaks asset: expected {expected_digest}, got {actual_digest}.")
+        sys.exit(1)
+
+def download_file(session, url, dest_path):
+    with open_download(session, url) as r:
         with open(dest_path, "wb") as f:
-            for chunk in r.iter_content(chunk_size=8192):
-                f.write(chunk)
+            shutil.copyfileobj(r.raw, f, length=DOWNLOAD_CHUNK_SIZE)
     dprint(f"File downloaded to: {dest_path}")
 
-def run_gitleaks(gitleaks_path, report_path, no_git, repo_location):
+def is_binary_member(name):
+    return name.rsplit("/", 1)[-1] in ("gitleaks", "gitleaks.exe")
+
+def find_binary_member(names):
+    for name in names:
+        if is_binary_member(name):
+            return name
+    return None
+
+def _extract_binary_member(tar_ref, dest_path):
+    for member in tar_ref:
+        if member.isfile() and is_binary_member(member.name):
+            with tar_ref.extractfile(member) as src, open(dest_path, "wb") as dst:
+                shutil.copyfileobj(src, dst, length=DOWNLOAD_CHUNK_SIZE)
+            return dest_path
+    return None
+
+def extract_tar_gz(stream, dest_dir):
+    dest_path = os.path.join(dest_dir, BINARY_NAME)
+    # Only the tarfile backend extracts the binary alone. System tar unpacks every
+    # member into dest_dir (GNU tar needs --wildcards for member patterns, which
+    # bsdtar rejects). The checksum is verified by the caller before anything runs.
+    if os.environ.get("SECUTIL_USE_SYSTEM_TAR", "1") != "0" and shutil.which("tar"):
+        dprint(f"Extracting with system tar into: {dest_dir}")
+        with tempfile.TemporaryFile() as listing:
+            process = subprocess.Popen(
+                ["tar", "-xzvf", "-", "-C", dest_dir],
+                stdin=subprocess.PIPE,
+                stdout=listing,
+                stderr=subprocess.STDOUT,
+                bufsize=0
+            )
+            try:
+                shutil.copyfileobj(stream, process.stdin, length=DOWNLOAD_CHUNK_SIZE)
+            except BrokenPipeError:
+                pass
+            finally:
+                process.stdin.close()
+            process.wait()
+            listing.seek(0)
+            output = listing.read().decode("utf-8", errors="replace")
+        if process.returncode != 0:
+            log_error(f"tar exited with return code {process.returncode} while extracting gitleaks: {output.strip()}")
+            sys.exit(1)
+        names = [line[2:] if line.startswith("x ") else line for line in output.splitlines()]
+        member = find_binary_member(name for name in names if os.path.isfile(os.path.join(dest_dir, name)))
+        if member is None:
+            return None
+        os.replace(os.path.join(dest_dir, member), dest_path)
+        return dest_path
+    import tarfile
+    dprint(f"Extracting with tarfile into: {dest_dir} (igzip: {igzip is not None})")
+    if igzip is not None:
+        with igzip.IGzipFile(fileobj=stream, mode="rb") as gz:
+            with tarfile.open(fileobj=gz, mode="r|") as tar_ref:
+                return _extract_binary_member(tar_ref, dest_path)
+    with tarfile.open(fileobj=stream, mode="r|gz") as tar_ref:
+        return _extract_binary_member(tar_ref, dest_path)
+
+def fetch_gitleaks(session, download_url, tmp_dir, expected_digest=None):
+    if download_url.endswith(".zip"):
+        import io
+        import zipfile
+        with open_download(session, download_url) as r:
+            buffer = io.BytesIO()
+            shutil.copyfileobj(r.raw, buffer, length=DOWNLOAD_CHUNK_SIZE)
+        buffer.seek(0)
+        verify_digest(file_sha256(buffer), expected_digest)
+        with zipfile.ZipFile(buffer, "r") as zip_ref:
+            member = find_binary_member(info.filename for info in zip_ref.infolist() if not info.is_dir())
+            if member is None:
+                log_error("Failed to locate the gitleaks binary extracted from ZIP.")
+                sys.exit(1)
+            gitleaks_bin = os.path.join(tmp_dir, BINARY_NAME)
+            with zip_ref.open(member) as src, open(gitleaks_bin, "wb") as dst:
+                shutil.copyfileobj(src, dst, length=DOWNLOAD_CHUNK_SIZE)
+    elif download_url.endswith(".tar.gz") or download_url.endswith(".tgz"):
+        with open_download(session, download_url) as r:
+            stream = HashingReader(r.raw)
+            gitleaks_bin = extract_tar_gz(stream, tmp_dir)
+            stream.drain()
+        verify_digest(stream.hexdigest(), expected_digest)
+        if not gitleaks_bin or not os.path.isfile(gitleaks_bin):
+            log_error("Failed to locate the gitleaks binary extracted from TAR.GZ.")
+            sys.exit(1)
+    else:
+        gitleaks_bin = os.path.join(tmp_dir, "gitleaks_asset")
+        download_file(session, download_url, gitleaks_bin)
+        with open(gitleaks_bin, "rb") as f:
+            verify_digest(file_sha256(f), expected_digest)
+    return gitleaks_bin
+
+def install_cached_binary(gitleaks_bin, cached_bin):
+    partial_bin = None
+    try:
+        os.makedirs(os.path.dirname(cached_bin), exist_ok=True)
+        fd, partial_bin = tempfile.mkstemp(prefix=".gitleaks-", suffix=".partial", dir=os.path.dirname(cached_bin))
+        os.close(fd)
+        shutil.copy2(gitleaks_bin, partial_bin)
+        os.replace(partial_bin, cached_bin)
+    except OSError as e:
+        log_info(f"Warning: unable to cache gitleaks binary: {e}")
+        if partial_bin and os.path.exists(partial_bin):
+            os.remove(partial_bin)
+        return gitleaks_bin
+    dprint(f"Cached gitleaks binary at: {cached_bin}")
+    return cached_bin
+
+def prepare_gitleaks(tmp_dir, refresh):
+    with create_session() as session:
+        cached_release = {} if refresh else load_cached_release()
+        fallback_bin = cached_binary_path(cached_release["tag_name"]) if cached_release.get("tag_name") else None
+        if fallback_bin and not os.path.isfile(fallback_bin):
+            fallback_bin = None
+        release_data, etag = get_latest_gitleaks_release(session, cached_release.get("etag"), fallback_bin)
+        if release_data is None:
+            tag_name = cached_release.get("tag_name")
+        else:
+            tag_name = release_data.get("tag_name")
+        cached_bin = cached_binary_path(tag_name) if tag_name else None
+        if cached_bin and not refresh and os.path.isfile(cached_bin):
+            log_info(f"Using cached gitleaks {tag_name}.")
+            gitleaks_bin = cached_bin
+        else:
+            if release_data is None:
+                release_data, etag = get_latest_gitleaks_release(session)
+                tag_name = release_data.get("tag_name")
+                cached_bin = cached_binary_path(tag_name) if tag_name else None
+            download_url = select_asset_for_platform(release_data)
+            expected_digest = get_expected_digest(session, release_data, download_url)
+            gitleaks_bin = fetch_gitleaks(session, download_url, tmp_dir, expected_digest)
+            if cached_bin:
+                gitleaks_bin = install_cached_binary(gitleaks_bin, cached_bin)
+        if tag_name:
+            save_cached_release(etag, tag_name)
+    return gitleaks_bin
+
+def plan_gitleaks_shards(repo_location):
+    if MAX_WORKERS < 2:
+        return [None]
+    try:
+        commit_count = int(subprocess.check_output(
+            ["git", "rev-list", "--count", "--all"],
+            stderr=subprocess.DEVNULL,
+            cwd=repo_location
+        ))
+        if commit_count <= SHARD_COMMIT_THRESHOLD:
+            return [None]
+        first_parents = subprocess.check_output(
+            ["git", "rev-list", "--first-parent", "HEAD"],
+            stderr=subprocess.DEVNULL,
+            cwd=repo_location
+        ).decode("ascii").split()
+    except (subprocess.CalledProcessError, OSError, ValueError):
+        return [None]
+    step = -(-len(first_parents) // MAX_WORKERS)
+    shards = []
+    previous = "--all"
+    for boundary in first_parents[step::step]:
+        shards.append(f"--full-history {previous} ^{boundary}")
+        previous = boundary
+    shards.append(f"--full-history {previous}")
+    dprint(f"Splitting {commit_count} commits into {len(shards)} gitleaks shards: {shards}")
+    return shards
+
+def start_gitleaks(gitleaks_path, report_path, no_git, repo_location, max_target_megabytes=None):
     cmd = [gitleaks_path, "detect"]
     if no_git:
         cmd.append("--no-git")
-    cmd.extend(["-f", "json", "-r", report_path])
+    if max_target_megabytes:
+        cmd.extend(["--max-target-megabytes", str(max_target_megabytes)])
+    shards = [None] if no_git else plan_gitleaks_shards(repo_location)
+    if len(shards) == 1:
+        report_paths = [report_path]
+        commands = [cmd + ["-f", "json", "-r", report_path]]
+    else:
+        report_root, report_ext = os.path.splitext(report_path)
+        report_paths = [f"{report_root}-{i}{report_ext}" for i in range(len(shards))]
+        commands = [
+            cmd + [f"--log-opts={log_opts}", "-f", "json", "-r", shard_report]
+            for log_opts, shard_report in zip(shards, report_paths)
+        ]
     log_info(f"Executing gitleaks.")
-    dprint(f"Full command: {cmd} in directory: {repo_location}")
-    result = subprocess.run(cmd, cwd=repo_location, capture_output=True, text=True, check=False)
-    dprint(f"Command result - Return code: {result.returncode}, STDOUT: {result.stdout}, STDERR: {result.stderr}")
-    if result.returncode not in (0, 1):
-        log_error("Error executing gitleaks:")
-        log_error(f"Return code: {result.returncode}")
-        log_error(f"Output: {result.stdout}")
-        log_error(f"Error: {result.stderr}")
-        sys.exit(result.returncode)
-    dprint(f"Report generated at: {report_path}")
-
-def extract_context_for_finding(finding, repo_location):
+    stdout = subprocess.PIPE if DEBUG else subprocess.DEVNULL
+    processes = []
+    for command in commands:
+        dprint(f"Full command: {command} in directory: {repo_location}")
+        processes.append(subprocess.Popen(command, cwd=repo_location, stdout=stdout, stderr=subprocess.PIPE))
+    return processes, report_paths
+
+def wait_gitleaks(processes):
+    for i, process in enumerate(processes):
+        output, error = process.communicate()
+        failed = process.returncode not in (0, 1)
+        if DEBUG or failed:
+            output = output.decode("utf-8", errors="replace") if output is not None else None
+            error = error.decode("utf-8", errors="replace")
+            dprint(f"Command result - Return code: {process.returncode}, STDOUT: {output}, STDERR: {error}")
+        if failed:
+            for other in processes[i + 1:]:
+                other.kill()
+                other.wait()
+            log_error("Error executing gitleaks:")
+            log_error(f"Return code: {process.returncode}")
+            if output is not None:
+                log_error(f"Output: {output}")
+            log_error(f"Error: {error}")
+            sys.exit(process.returncode)
+
+class GitCatFile:
+    def __init__(self, repo_location):
+        self.repo_location = repo_location
+        self.process = None
+
+    def start(self):
+        dprint(f"Starting git cat-file --batch in directory: {self.repo_location}")
+        self.process = subprocess.Popen(
+            ["git", "cat-file", "--batch"],
+            stdin=subprocess.PIPE,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.DEVNULL,
+            cwd=self.repo_location
+        )
+
+    def read_object(self, object_name):
+        if self.process is None:
+            self.start()
+        self.process.stdin.write(f"{object_name}\n".encode("utf-8"))
+        self.process.stdin.flush()
+        header = self.process.stdout.readline()
+        if not header:
+            raise OSError("git cat-file exited unexpectedly")
+        if header.endswith(b" missing\n") or header.endswith(b" ambiguous\n"):
+            return None, None
+        _, object_type, size = header.split()
+        content = self.process.stdout.read(int(size) + 1)[:-1]
+        return object_type, content
+
+    def read_blob(self, commit, file_path):
+        object_type, content = self.read_object(f"{commit}:{file_path}")
+        if object_type != b"blob":
+            return None
+        return content
+
+    def warm_up(self):
+        try:
+            self.read_object("HEAD")
+        except OSError as e:
+            dprint(f"Unable to warm up git cat-file: {e}")
+
+    def close(self):
+        if self.process is not None:
+            self.process.stdin.close()
+            self.process.wait()
+            self.process = None
+
+class GitCatFilePool:
+    def __init__(self, repo_location, size):
+        self.repo_location = repo_location
+        self.size = size
+        self.readers = []
+        self.idle = queue.Queue()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        try:
+            return self.idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self.lock:
+            if len(self.readers) < self.size:
+                reader = GitCatFile(self.repo_location)
+                self.readers.append(reader)
+                return reader
+        return self.idle.get()
+
+    def release(self, reader):
+        self.idle.put(reader)
+
+    def warm_up(self):
+        reader = self.acquire()
+        try:
+            reader.warm_up()
+        finally:
+            self.release(reader)
+
+    def close(self):
+        for reader in self.readers:
+            reader.close()
+        self.readers = []
+
+def _read_blob(reader, commit, file_path):
+    try:
+        return reader.read_blob(commit, file_path)
+    except OSError:
+        return None
+
+def _split_lines(content):
+    lines = content.decode("utf-8", errors="replace").split("\n")
+    if not lines[-1]:
+        lines.pop()
+    return lines
+
+def extract_context_for_finding(finding, repo_location, lines=None):
     commit = finding.get("Commit")
     file_path = finding.get("File")
     start_line = finding.get("StartLine")
     end_line = finding.get("EndLine")
     dprint(f"Extracting context for file: {file_path}, commit: {commit}, lines: {start_line}-{end_line}")
+    context_start = max(0, start_line - 1 - 3)
+    context_end = max(context_start, end_line - 1 + 3 + 1)
     if not commit:
         full_path = os.path.join(repo_location, file_path)
         try:
-            with open(full_path, "r", encoding="utf-8") as f:
-                content = f.read()
-            lines = content.splitlines()
+            with open(full_path, "r", encoding="utf-8", errors="replace") as f:
+                context = [line.rstrip("\n") for line in islice(f, context_start, context_end)]
         except Exception as e:
             log_error(f"Unable to retrieve content of file '{file_path}' in current state: {e}")
             return None
     else:
-        try:
-            result = subprocess.check_output(
-                ["git", "show", f"{commit}:{file_path}"],
-                stderr=subprocess.DEVNULL,
-                cwd=repo_location
-            )
-            content = result.decode("utf-8", errors="replace")
-            lines = content.splitlines()
-        except subprocess.CalledProcessError:
+        if lines is None:
             log_error(f"Unable to retrieve content of file '{file_path}' at commit '{commit}'.")
             return None
-    context_start = max(0, start_line - 1 - 3)
-    context_end = min(len(lines), end_line - 1 + 3 + 1)
-    context = lines[context_start:context_end]
-    dprint(f"Extracted context (lines {context_start + 1} to {context_end}): {context}")
+        context = [line.rstrip("\r") for line in lines[context_start:context_end]]
+    dprint(f"Extracted context (lines {context_start + 1} to {context_start + len(context)}): {context}")
     return context
 
+def extract_contexts(findings, repo_location, blob_reader, executor):
+    findings_by_blob = defaultdict(list)
+    for finding in findings:
+        findings_by_blob[(finding.get("Commit") or "", finding.get("File"))].append(finding)
+    blob_keys = list(findings_by_blob)
+    shard_size = -(-len(blob_keys) // MAX_WORKERS)
+    shards = [blob_keys[i:i + shard_size] for i in range(0, len(blob_keys), shard_size)]
+    dprint(f"Extracting contexts for {len(blob_keys)} blobs in {len(shards)} shards")
+
+    def extract_shard(shard):
+        reader = blob_reader.acquire()
+        try:
+            for blob_key in shard:
+                commit, file_path = blob_key
+                content = _read_blob(reader, commit, file_path) if commit else None
+                lines = _split_lines(content) if content is not None else None
+                del content
+                for finding in findings_by_blob[blob_key]:
+                    context = extract_context_for_finding(finding, repo_location, lines)
+                    finding["context"] = context if context is not None else []
+        finally:
+            blob_reader.release(reader)
+
+    for _ in executor.map(extract_shard, shards):
+        pass
+
+def enrich_findings(findings, repo_location, blob_reader):
+    findings = iter(findings)
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as executor:
+        while True:
+            batch = list(islice(findings, FINDINGS_BATCH_SIZE))
+            if not batch:
+                return
+            extract_contexts(batch, repo_location, blob_reader, executor)
+            yield from batch
+
+def load_findings(report_path):
+    dprint(f"Loading report {report_path} (streaming: {json_stream is not None})")
+    if json_stream is None:
+        with open(report_path, "rb") as f:
+            try:
+                findings = orjson.loads(f.read()) if orjson is not None else json.load(f)
+            except json.JSONDecodeError as e:
+                log_error(f"Error decoding JSON report: {e}")
+                return
+        yield from findings
+        return
+    with open(report_path, "rb") as f:
+        try:
+            for finding in json_stream.load(f):
+                yield json_stream.to_standard_types(finding)
+        except ValueError as e:
+            log_error(f"Error decoding JSON report: {e}")
+
+def _dump_finding(finding):
+    if orjson is not None:
+        return orjson.dumps(finding, option=orjson.OPT_INDENT_2 | orjson.OPT_NON_STR_KEYS)
+    return json.dumps(finding, indent=2, ensure_ascii=False).encode("utf-8")
+
+def write_findings(output_file, findings):
+    count = 0
+    fd, partial_file = tempfile.mkstemp(
+        prefix=".gitleaks-context-",
+        suffix=".partial",
+        dir=os.path.dirname(os.path.abspath(output_file))
+    )
+    try:
+        with os.fdopen(fd, "wb") as f_out:
+            for finding in findings:
+                f_out.write(b"[\n  " if not count else b",\n  ")
+                f_out.write(_dump_finding(finding).replace(b"\n", b"\n  "))
+                count += 1
+            if count:
+                f_out.write(b"\n]")
+        if count:
+            umask = os.umask(0)
+            os.umask(umask)
+            os.chmod(partial_file, 0o666 & ~umask)
+            os.replace(partial_file, output_file)
+    finally:
+        if os.path.exists(partial_file):
+            os.remove(partial_file)
+    return count
+
 def main():
     global DEBUG
     parser = argparse.ArgumentParser(
@@ -120,6 +625,8 @@ def main():
     parser.add_argument("--no-cleanup", action="store_true", help="Do not remove temporary files after execution.")
     parser.add_argument("--no-git", action="store_true", help="Disable recursive scanning of repository history (use the '--no-git' flag).")
     parser.add_argument("--repo", default=".", help="Path of the cloned repository (default: '.').")
+    parser.add_argument("--max-target-megabytes", type=int, help="Skip files larger than this size in megabytes (passed to gitleaks).")
+    parser.add_argument("--refresh", action="store_true", help="Ignore the cached gitleaks binary and download the latest release again.")
     parser.add_argument("-v", "--debug", action="store_true", help="Habilita o modo de depuração com informações adicionais.")
     args = parser.parse_args()
     DEBUG = args.debug
@@ -130,60 +637,28 @@ def main():
     tmp_dir = tempfile.mkdtemp(prefix="gitleaks_")
     dprint(f"Temporary directory: {tmp_dir}")
     try:
-        release_data = get_latest_gitleaks_release()
-        download_url = select_asset_for_platform(release_data)
-        gitleaks_asset = os.path.join(tmp_dir, "gitleaks_asset")
-        download_file(download_url, gitleaks_asset)
-        if download_url.endswith(".zip"):
-            import zipfile
-            with zipfile.ZipFile(gitleaks_asset, "r") as zip_ref:
-                zip_ref.extractall(tmp_dir)
-            exe_path = os.path.join(tmp_dir, "gitleaks")
-            if not os.path.exists(exe_path):
-                for root, dirs, files in os.walk(tmp_dir):
-                    if "gitleaks" in files:
-                        exe_path = os.path.join(root, "gitleaks")
-                        break
-            if not os.path.exists(exe_path):
-                log_error("Failed to locate the gitleaks binary extracted from ZIP.")
-                sys.exit(1)
-            gitleaks_bin = exe_path
-        elif download_url.endswith(".tar.gz") or download_url.endswith(".tgz"):
-            import tarfile
-            with tarfile.open(gitleaks_asset, "r:gz") as tar_ref:
-                tar_ref.extractall(tmp_dir)
-            exe_path = os.path.join(tmp_dir, "gitleaks")
-            if not os.path.exists(exe_path):
-                for root, dirs, files in os.walk(tmp_dir):
-                    if "gitleaks" in files:
-                        exe_path = os.path.join(root, "gitleaks")
-                        break
-            if not os.path.exists(exe_path):
-                log_error("Failed to locate the gitleaks binary extracted from TAR.GZ.")
-                sys.exit(1)
-            gitleaks_bin = exe_path
-        else:
-            gitleaks_bin = gitleaks_asset
+        gitleaks_bin = prepare_gitleaks(tmp_dir, args.refresh)
         st = os.stat(gitleaks_bin)
         os.chmod(gitleaks_bin, st.st_mode | stat.S_IEXEC)
         dprint(f"Execution permission granted for: {gitleaks_bin}")
         report_path = os.path.join(tmp_dir, "gitleaks-report.json")
-        run_gitleaks(gitleaks_bin, report_path, args.no_git, repo_location)
-        with open(report_path, "r", encoding="utf-8") as f:
-            try:
-                findings = json.load(f)
-            except json.JSONDecodeError as e:
-                log_error(f"Error decoding JSON report: {e}")
-                findings = []
-        if not findings:
+        output_file = "gitleaks-context.json"
+        blob_reader = GitCatFilePool(repo_location, MAX_WORKERS)
+        try:
+            gitleaks_processes, report_paths = start_gitleaks(
+                gitleaks_bin, report_path, args.no_git, repo_location, args.max_target_megabytes
+            )
+            if not args.no_git:
+                blob_reader.warm_up()
+            wait_gitleaks(gitleaks_processes)
+            findings = chain.from_iterable(load_findings(path) for path in report_paths)
+            findings = enrich_findings(findings, repo_location, blob_reader)
+            count = write_findings(output_file, findings)
+        finally:
+            blob_reader.close()
+        if not count:
             log_info("No vulnerabilities found.")
         else:
-            for finding in findings:
-                context = extract_context_for_finding(finding, repo_location)
-                finding["context"] = context if context is not None else []
-            output_file = "gitleaks-context.json"
-            with open(output_file, "w", encoding="utf-8") as f_out:
-                json.dump(findings, f_out, indent=4, ensure_ascii=False)
             log_info(f"Output file with contexts saved at: {output_file}")
     finally:
         if args.no_cleanup:
@@ -191,7 +666,7 @@ def main():
         else:
             dprint(f"Removing temporary directory: {tmp_dir}")
             log_info(f"Cleaning up temporary files.")
-            shutil.rmtree(tmp_dir)
+            shutil.rmtree(tmp_dir, ignore_errors=True)
 
 if __name__ == "__main__":
     main()